@@ -1,61 +1,172 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import parse_qs, urlparse
+
 import streamlit as st
-from fastembed import TextEmbedding
 import yt_dlp
 import numpy as np
 
+from embed import MODEL_NAME, get_encoder, embed_batch, embed_query
+
 # --- PAGE CONFIGURATION ---
 st.set_page_config(page_title="IITM Neural Search", page_icon="⚡", layout="wide")
 
-# --- 1. LOAD LIGHTWEIGHT AI ---
-@st.cache_resource
-def load_model():
-    # This loads a quantized, lightweight version of the same neural network
-    # It is fast and uses very little RAM.
-    return TextEmbedding(model_name="BAAI/bge-small-en-v1.5")
+# --- SETTINGS ---
+CARD_TMPL = """
+<div style="background-color: #f0f8ff; padding: 15px; border-radius: 10px; margin-bottom: 10px; border-left: 5px solid #007bff;">
+    <a href="{url}" target="_blank" style="text-decoration: none; color: #000; font-weight: bold; font-size: 18px;">
+        🎥 {title}
+    </a>
+    <div style="font-size: 12px; color: #666; margin-top: 5px;">Relevance Score: {score:.2f}</div>
+</div>
+"""
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+CACHE_TTL = 3600  # Seconds before a course is re-scraped for new lectures
+PREFETCH_COUNT = 5
+TOP_K = 10
+MIN_SCORE = 0.4  # Threshold for "good match"
+POLL_INTERVAL = 0.5  # Seconds between checks on a background indexing job
+CHANNEL_HANDLE = "@IITMadrasBSDegreeProgramme"
+YOUTUBE_API_KEY = os.environ.get("YOUTUBE_API_KEY")
+HIDDEN_TITLES = {"[Private video]", "[Deleted video]", "Private video", "Deleted video"}
+logger = logging.getLogger(__name__)
+JUNK_RE = re.compile(r"shorts|testimonial|webinar|event|hackathon|promo|teaser|live session", re.IGNORECASE)
 
+# --- 1. LOAD LIGHTWEIGHT AI ---
 try:
-    model = load_model()
+    get_encoder()
 except Exception as e:
     st.error(f"Error loading AI model: {e}")
     st.stop()
 
 # --- 2. BACKEND LOGIC ---
+@st.cache_resource
+def get_executor():
+    # Worker pool for courses a user asked to load (network-bound)
+    return ThreadPoolExecutor(max_workers=2)
+
+@st.cache_resource
+def get_prefetch_executor():
+    # Separate pool for pre-warming, so user loads never queue behind it
+    return ThreadPoolExecutor(max_workers=2)
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization -> (int8 codes, float32 scales)"""
+    scales = np.abs(vectors).max(axis=-1, keepdims=True) / 127
+    codes = np.ascontiguousarray(np.round(vectors / scales), dtype=np.int8)
+    return codes, np.ascontiguousarray(scales.squeeze(-1), dtype=np.float32)
+
+def dequantize_int8(codes, scales):
+    """Inverse of quantize_int8 -> C-contiguous float32 matrix for BLAS scoring"""
+    return np.ascontiguousarray(codes * scales[:, np.newaxis], dtype=np.float32)
+
+def youtube_api():
+    """Builds a YouTube Data API v3 client (one per call, they aren't thread-safe)"""
+    from googleapiclient.discovery import build
+    return build("youtube", "v3", developerKey=YOUTUBE_API_KEY, cache_discovery=False)
+
+def api_list_all(resource, **params):
+    """Yields every item of a paginated Data API list call, 50 per request"""
+    page_token = None
+    while True:
+        response = resource.list(maxResults=50, pageToken=page_token, **params).execute()
+        yield from response.get('items', [])
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+def api_channel_playlists():
+    """Lists the channel's playlists in the same shape as yt-dlp's flat entries"""
+    yt = youtube_api()
+    channel = yt.channels().list(part="id", forHandle=CHANNEL_HANDLE).execute()
+    channel_id = channel['items'][0]['id']
+    return [
+        {"title": item['snippet']['title'], "url": f"https://www.youtube.com/playlist?list={item['id']}"}
+        for item in api_list_all(yt.playlists(), part="snippet", channelId=channel_id)
+    ]
+
+def api_playlist_videos(playlist_url):
+    """Lists a playlist's videos in the same shape as yt-dlp's flat entries"""
+    playlist_id = parse_qs(urlparse(playlist_url).query)['list'][0]
+    return [
+        {"id": item['contentDetails']['videoId'], "title": item['snippet']['title']}
+        for item in api_list_all(youtube_api().playlistItems(), part="contentDetails,snippet", playlistId=playlist_id)
+    ]
+
 @st.cache_data(ttl=3600)
 def fetch_course_catalog():
-    """Scrapes the live YouTube playlists tab"""
+    """Lists the channel's playlists (Data API if a key is set, else scrapes the playlists tab)"""
     ydl_opts = {
         'quiet': True, 
         'extract_flat': True, 
         'playlistend': 500,
         'ignoreerrors': True
     }
-    channel_url = "https://www.youtube.com/@IITMadrasBSDegreeProgramme/playlists"
+    channel_url = f"https://www.youtube.com/{CHANNEL_HANDLE}/playlists"
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    raw_entries = None
+    if YOUTUBE_API_KEY:
         try:
-            info = ydl.extract_info(channel_url, download=False)
-            raw_entries = info.get('entries', [])
+            raw_entries = api_channel_playlists()
         except Exception:
-            return {}
+            # Quota / HTTP errors: fall back to scraping below
+            logger.warning("YouTube Data API playlist listing failed, scraping instead", exc_info=True)
+
+    if raw_entries is None:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            try:
+                info = ydl.extract_info(channel_url, download=False)
+                raw_entries = info.get('entries', [])
+            except Exception:
+                return {}
 
     clean_catalog = {}
-    junk_terms = ["shorts", "testimonial", "webinar", "event", "hackathon", "promo", "teaser", "live session"]
     
     for entry in raw_entries:
         title = entry.get('title', 'Unknown')
         url = entry.get('url')
-        if title and url and not any(term in title.lower() for term in junk_terms):
+        if title and url and not JUNK_RE.search(title):
             clean_catalog[title] = url
             
     return dict(sorted(clean_catalog.items()))
 
+@st.cache_data(ttl=CACHE_TTL, max_entries=32, show_spinner=False)
 def index_course(playlist_url):
     """Downloads titles and creates AI Embeddings"""
+    # Reuse embeddings from a recent run if this playlist was indexed before
+    key = hashlib.sha1(f"{MODEL_NAME}|int8|{playlist_url}".encode()).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{key}.npz")
+    try:
+        fresh = time.time() - os.path.getmtime(cache_path) < CACHE_TTL
+    except OSError:
+        fresh = False
+    if fresh:
+        try:
+            with np.load(cache_path, allow_pickle=True) as cached:
+                meta = cached['meta'].tolist()
+                return len(meta), cached['emb'], cached['scale'], meta
+        except Exception:
+            pass  # Corrupt / unreadable cache file: treat as a miss and re-index
+
     ydl_opts = {'quiet': True, 'extract_flat': True, 'ignoreerrors': True}
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(playlist_url, download=False)
-        videos = info.get('entries', [])
+    videos = None
+    if YOUTUBE_API_KEY:
+        try:
+            videos = api_playlist_videos(playlist_url)
+        except Exception:
+            # Quota / HTTP errors: fall back to scraping below
+            logger.warning("YouTube Data API lookup of %s failed, scraping instead", playlist_url, exc_info=True)
+
+    if videos is None:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(playlist_url, download=False)
+            videos = info.get('entries', [])
 
     titles = []
     metadata = []
@@ -64,17 +175,49 @@ def index_course(playlist_url):
         if vid and vid.get('title'):
             title = vid['title']
             vid_id = vid['id']
-            if title not in ["[Private video]", "[Deleted video]"]:
+            if title not in HIDDEN_TITLES:
                 titles.append(title)
                 metadata.append({"id": vid_id, "title": title})
 
     if titles:
-        # Generate Embeddings using FastEmbed
-        # It returns a generator, so we convert to list -> numpy array
-        embeddings = list(model.embed(titles))
-        return len(titles), np.array(embeddings), metadata
+        # Generate Embeddings using FastEmbed (shared encoder, unit vectors)
+        embeddings = embed_batch(titles)
+        # Both caches keep int8 codes + one scale per title (4x smaller);
+        # scoring uses a float32 matrix, dequantized once per course load
+        codes, scales = quantize_int8(embeddings)
+
+        # Write to a temp file and swap it in, so readers never see a partial zip.
+        # The cache is only an optimisation: a failed write must not lose the index.
+        tmp_path = None
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".npz")
+            os.close(fd)
+            np.savez(tmp_path, emb=codes, scale=scales, meta=np.array(metadata, dtype=object))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return len(titles), codes, scales, metadata
         
-    return 0, None, []
+    return 0, None, None, []
+
+def warm_course(playlist_url):
+    """Indexes a course only to fill the caches; the result isn't kept"""
+    index_course(playlist_url)
+
+@st.cache_resource
+def prefetch_courses(playlist_urls):
+    # Runs once per process (per catalog), not once per session
+    return {url: get_prefetch_executor().submit(warm_course, url) for url in playlist_urls}
+
+def load_course(playlist_url, prefetch=None):
+    """Waits for an in-flight prefetch of the course, then reads it from cache"""
+    # Still queued -> cancel it and index here; already running -> wait for it.
+    # A failed prefetch just means a fresh attempt below.
+    if prefetch is not None and not prefetch.cancel():
+        wait([prefetch])
+    return index_course(playlist_url)
 
 # --- 3. FRONTEND UI ---
 st.sidebar.title("⚡ IITM Fast-Search")
@@ -86,21 +229,51 @@ if 'catalog' not in st.session_state:
         st.session_state.catalog = fetch_course_catalog()
     st.sidebar.success(f"Loaded {len(st.session_state.catalog)} courses")
 
+# Pre-warm the first few courses in the background
+prefetch = prefetch_courses(tuple(st.session_state.catalog.values())[:PREFETCH_COUNT])
+
 # Select Course
 selected_course = st.sidebar.selectbox("1. Select Course:", list(st.session_state.catalog.keys()))
 
-# Load Button
+# Load Button (indexing runs in the worker pool so the UI stays live)
 if st.sidebar.button("2. Load Course Videos"):
     url = st.session_state.catalog[selected_course]
-    with st.spinner(f"Reading {selected_course}..."):
-        count, embeddings, meta = index_course(url)
+    # The prefetch dict is shared by every session, so read it, never mutate it
+    st.session_state.future = get_executor().submit(load_course, url, prefetch.get(url))
+    st.session_state.pending_course = selected_course
+    st.rerun()
+
+@st.fragment(run_every=POLL_INTERVAL)
+def indexing_status():
+    """Polls the background indexing job without rerunning the whole page"""
+    future = st.session_state.get('future')
+    if future is None or future.done():
+        st.rerun()
+    st.info(f"Reading {st.session_state.pending_course}...")
+
+future = st.session_state.get('future')
+if future is not None and future.done():
+    st.session_state.future = None
+    error = future.exception()
+    if error is not None:
+        st.error(f"Error indexing {st.session_state.pending_course}: {error}")
+    else:
+        count, codes, scales, meta = future.result()
         if count > 0:
+            embeddings = dequantize_int8(codes, scales)
+            assert embeddings.flags['C_CONTIGUOUS'] and embeddings.strides[1] == embeddings.itemsize
             st.session_state.active_embeddings = embeddings
+            # Reusable per-query score buffer, filled in place by np.dot
+            st.session_state.scores_buf = np.empty(count, dtype=np.float32)
             st.session_state.active_meta = meta
-            st.session_state.course_name = selected_course
+            st.session_state.course_name = st.session_state.pending_course
+            st.session_state.pop('results', None)
             st.success(f"✅ Ready! Indexed {count} lectures.")
         else:
             st.error("No videos found in this playlist.")
+elif future is not None:
+    with st.sidebar:
+        indexing_status()
 
 st.sidebar.markdown("---")
 
@@ -109,39 +282,45 @@ st.title("Neural Search Engine (FastEmbed)")
 
 if 'active_embeddings' in st.session_state:
     st.caption(f"Searching inside: **{st.session_state.course_name}**")
-    query = st.text_input("Enter Topic:", placeholder="e.g. Gradient Descent, Hypothesis Testing...")
+    # A form only reruns on submit, so the query isn't re-encoded per keystroke
+    with st.form("search"):
+        query = st.text_input("Enter Topic:", placeholder="e.g. Gradient Descent, Hypothesis Testing...")
+        submitted = st.form_submit_button("Search")
     
-    if query:
+    # Search only on submit; other reruns just redraw the stored results
+    if submitted and query:
         # 1. Embed Query
-        query_vec = list(model.embed([query]))[0]
+        query_vec = embed_query(query)
         
         # 2. Cosine Similarity (Manual Numpy Calculation)
-        # (dot product of query and all video vectors)
-        scores = np.dot(st.session_state.active_embeddings, query_vec)
+        # (both sides are float32 unit vectors, so one SGEMV gives cosine scores)
+        scores = np.dot(st.session_state.active_embeddings, query_vec, out=st.session_state.scores_buf)
         
-        # 3. Get Top 10 Indices
-        top_indices = np.argsort(scores)[-10:][::-1]
+        # 3. Get Top 10 Indices (partial selection, drop weak matches,
+        #    then sort only the survivors)
+        k = min(TOP_K, len(scores))
+        top_indices = np.argpartition(scores, -k)[-k:]
+        top_indices = top_indices[scores[top_indices] > MIN_SCORE]
+        top_indices = top_indices[np.argsort(scores[top_indices])[::-1]]
         
+        # All result cards as one markdown string ("" when nothing matched)
+        st.session_state.results = "".join(
+            CARD_TMPL.format(
+                url=f"https://www.youtube.com/watch?v={st.session_state.active_meta[idx]['id']}",
+                title=st.session_state.active_meta[idx]['title'],
+                score=scores[idx],
+            )
+            for idx in top_indices
+        )
+    elif submitted:
+        st.session_state.pop('results', None)
+    
+    if 'results' in st.session_state:
         st.markdown("### Results")
         
-        found = False
-        for idx in top_indices:
-            score = scores[idx]
-            if score > 0.4: # Threshold for "good match"
-                found = True
-                meta = st.session_state.active_meta[idx]
-                url = f"https://www.youtube.com/watch?v={meta['id']}"
-                
-                st.markdown(f"""
-                <div style="background-color: #f0f8ff; padding: 15px; border-radius: 10px; margin-bottom: 10px; border-left: 5px solid #007bff;">
-                    <a href="{url}" target="_blank" style="text-decoration: none; color: #000; font-weight: bold; font-size: 18px;">
-                        🎥 {meta['title']}
-                    </a>
-                    <div style="font-size: 12px; color: #666; margin-top: 5px;">Relevance Score: {score:.2f}</div>
-                </div>
-                """, unsafe_allow_html=True)
-        
-        if not found:
+        if st.session_state.results:
+            st.markdown(st.session_state.results, unsafe_allow_html=True)
+        else:
             st.warning("No close matches found. Try a different term.")
 
 else:
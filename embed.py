@@ -0,0 +1,40 @@
+import streamlit as st
+from fastembed import TextEmbedding
+import numpy as np
+import onnxruntime as ort
+
+MODEL_NAME = "BAAI/bge-small-en-v1.5"
+EMBED_DIM = 384
+EMBED_BATCH_SIZE = 32
+
+@st.cache_resource
+def get_encoder():
+    # FastEmbed serves this model as an int8 dynamically-quantized ONNX export,
+    # run through ONNX Runtime on the CPU (no PyTorch, int8 matmuls via VNNI).
+    # The CUDA provider is listed first when present (fastembed-gpu), but the
+    # export stays quantized so vectors match the disk cache; ops without CUDA
+    # kernels still run on the CPU, so don't expect a GPU speedup from it.
+    # Cached process-wide, so every page/session shares one encoder.
+    providers = ["CPUExecutionProvider"]
+    if "CUDAExecutionProvider" in ort.get_available_providers():
+        providers.insert(0, "CUDAExecutionProvider")
+    return TextEmbedding(model_name=MODEL_NAME, providers=providers)
+
+def embed_batch(texts):
+    """Encodes texts into an (N, EMBED_DIM) float32 matrix of unit vectors"""
+    # Encode in length-sorted mini-batches so each batch pads to similar
+    # lengths, then write each vector straight into its original row.
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vectors = get_encoder().embed([texts[i] for i in order], batch_size=EMBED_BATCH_SIZE)
+    embeddings = np.empty((len(texts), EMBED_DIM), dtype=np.float32)
+    for i, vec in zip(order, vectors):
+        embeddings[i] = vec
+    # L2-normalize so the dot product at query time is a true cosine score
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+def embed_query(text):
+    """Encodes a single query into a float32 unit vector"""
+    query_vec = next(iter(get_encoder().embed([text]))).astype(np.float32)
+    query_vec /= np.linalg.norm(query_vec)
+    return query_vec